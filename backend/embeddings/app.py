@@ -1,23 +1,238 @@
+import os
+
+# Pin the BLAS/OMP pools to the core count before torch/onnxruntime load;
+# the single gunicorn worker then owns every core instead of N workers
+# each spawning N threads and thrashing
+os.environ.setdefault('OMP_NUM_THREADS', str(os.cpu_count()))
+os.environ.setdefault('MKL_NUM_THREADS', str(os.cpu_count()))
+
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-from sentence_transformers import SentenceTransformer
-import os
+import numpy as np
+import orjson
+import queue
+import threading
+import time
+
+
+class ORJSONProvider(JSONProvider):
+    """orjson-backed JSON provider: ~5x faster than stdlib json for the
+    nested float lists these endpoints return."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
 # Load the embedding model
 model = None
 
+
+class OnnxEmbeddingModel:
+    """MiniLM exported to ONNX and served with ONNX Runtime.
+
+    Exposes the same `encode` interface the endpoints already use with
+    SentenceTransformer, so the two backends are interchangeable. Set
+    ONNX_MODEL_DIR to a pre-exported (and graph-optimized) model directory
+    to skip the export at startup.
+    """
+
+    def __init__(self, model_name):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        # Prefer the INT8-quantized graph unless FP32 is forced for A/B checks
+        model_dir = os.environ.get('ONNX_MODEL_DIR')
+        if os.environ.get('EMBEDDINGS_FP32') != '1':
+            int8_dir = os.environ.get('ONNX_MODEL_INT8_DIR')
+            if int8_dir and os.path.isdir(int8_dir):
+                model_dir = int8_dir
+        if model_dir and os.path.isdir(model_dir):
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_dir, provider='CPUExecutionProvider'
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        else:
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_name, export=True, provider='CPUExecutionProvider'
+            )
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32,
+               convert_to_numpy=True):
+        """Embed a string or list of strings, mirroring SentenceTransformer.encode.
+
+        Texts are encoded in length-sorted batches so short texts are not
+        padded out to the length of the longest text in the whole input.
+        """
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        # Sort by length so each batch pads to its own max, not the global max
+        order = np.argsort([len(t) for t in texts])
+        sorted_rows = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            sorted_rows.append(self._encode_batch(batch))
+        sorted_embeddings = np.concatenate(sorted_rows, axis=0)
+
+        # Invert the permutation back to input order
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+
+        if normalize_embeddings:
+            embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts):
+        """Run one forward pass and mean-pool to sentence embeddings."""
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, return_tensors='np'
+        )
+        outputs = self.model(**inputs)
+        hidden = np.asarray(outputs.last_hidden_state)
+
+        # Mean-pool over tokens, weighted by the attention mask
+        mask = inputs['attention_mask'][:, :, None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
 def get_model():
     global model
     if model is None:
+        if os.environ.get('USE_ONNX', '1') == '1':
+            try:
+                print("Loading ONNX embedding model...")
+                model = OnnxEmbeddingModel(MODEL_NAME)
+                print("Model loaded!")
+                return model
+            except ImportError:
+                print("optimum/onnxruntime not installed, falling back to PyTorch")
+            except Exception as e:
+                # A broken export or model dir must not kill the service at
+                # import time; serve from the PyTorch path instead
+                print(f"ONNX model load failed, falling back to PyTorch: {e}")
         print("Loading embedding model...")
-        model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        from sentence_transformers import SentenceTransformer
+        import torch
+        torch.set_num_threads(os.cpu_count())
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already fixed once torch has initialized its pools
+        model = SentenceTransformer(MODEL_NAME)
+        try:
+            # Swap the inner transformer to BetterTransformer so attention
+            # runs through torch's fused scaled_dot_product_attention
+            inner = model._first_module().auto_model
+            model._first_module().auto_model = inner.to_bettertransformer()
+            print("Applied BetterTransformer attention")
+        except Exception as e:
+            print(f"BetterTransformer unavailable, using eager attention: {e}")
+        if (os.environ.get('EMBEDDINGS_FP32') != '1'
+                and model.device.type == 'cpu'):
+            # INT8 dynamic quantization of the Linear layers: ~2x faster
+            # matmuls on CPU with <1% quality drop. Only valid for CPU
+            # modules — on GPU the model stays as loaded. Set
+            # EMBEDDINGS_FP32=1 to compare recall against full precision.
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            print("Applied INT8 dynamic quantization")
+        try:
+            # Move parameter tensors into shared memory so the pages stay
+            # shared across forked gunicorn workers even after inference
+            # touches tensor refcounts
+            model.share_memory()
+        except Exception:
+            pass
         print("Model loaded!")
     return model
 
 
+# Micro-batching for /embed: concurrent single-text requests are coalesced
+# into one model.encode call, which is far cheaper than N separate forward
+# passes. /embed/batch stays a direct fast-path.
+MAX_BATCH_SIZE = int(os.environ.get('EMBED_MAX_BATCH_SIZE', '32'))
+BATCH_WAIT_TIMEOUT_S = float(os.environ.get('EMBED_BATCH_WAIT_S', '0.01'))
+
+_batch_queue = queue.Queue()
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+
+class _PendingEmbed:
+    """A single /embed request waiting for the batch worker."""
+
+    __slots__ = ('text', 'event', 'embedding', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.event = threading.Event()
+        self.embedding = None
+        self.error = None
+
+
+def _batch_worker():
+    while True:
+        # Block for the first request, then drain until the batch is full
+        # or the wait timeout expires
+        pending = [_batch_queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT_TIMEOUT_S
+        while len(pending) < MAX_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(_batch_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            embeddings = get_model().encode(
+                [p.text for p in pending], normalize_embeddings=True
+            )
+            for p, row in zip(pending, embeddings):
+                p.embedding = row
+        except Exception as e:
+            for p in pending:
+                p.error = e
+        for p in pending:
+            p.event.set()
+
+
+def _ensure_worker():
+    # Started lazily so each gunicorn worker gets its own thread after fork
+    global _worker_thread
+    if _worker_thread is None or not _worker_thread.is_alive():
+        with _worker_lock:
+            if _worker_thread is None or not _worker_thread.is_alive():
+                _worker_thread = threading.Thread(target=_batch_worker, daemon=True)
+                _worker_thread.start()
+
+
+def _embed_batched(text):
+    """Enqueue a text and wait for the batch worker to embed it."""
+    _ensure_worker()
+    pending = _PendingEmbed(text)
+    _batch_queue.put(pending)
+    pending.event.wait()
+    if pending.error is not None:
+        raise pending.error
+    return pending.embedding
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -31,26 +246,24 @@ def embed():
         print("Received data for embedding: ", data)
         if not data or 'text' not in data:
             return jsonify({'error': 'Missing text field'}), 400
-        
+
         text = data['text']
-        
+
         if not text or not isinstance(text, str):
             return jsonify({'error': 'Text must be a non-empty string'}), 400
-        
-        model = get_model()
 
-        # Generate embedding
-        embedding = model.encode(text, normalize_embeddings=True)
-        
+        # Generate embedding (batched with any concurrent requests)
+        embedding = _embed_batched(text)
+
         # Convert to list for JSON serialization
         embedding_list = embedding.tolist()
-        
+
         return jsonify({
             'embedding': embedding_list,
             'dimension': len(embedding_list),
             'model': 'all-MiniLM-L6-v2'
         })
-    
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,31 +272,43 @@ def embed_batch():
     """Generate embeddings for multiple texts"""
     try:
         data = request.get_json()
-        
+
         if not data or 'texts' not in data:
             return jsonify({'error': 'Missing texts field'}), 400
-        
+
         texts = data['texts']
-        
+
         if not isinstance(texts, list) or len(texts) == 0:
             return jsonify({'error': 'texts must be a non-empty array'}), 400
-        
-        # Generate embeddings
-        embeddings = model.encode(texts, normalize_embeddings=True)
-        
-        # Convert to list for JSON serialization
-        embeddings_list = [emb.tolist() for emb in embeddings]
-        
+
+        # Generate embeddings; both backends encode length-sorted batches so
+        # padding is only to the per-batch max
+        embeddings = get_model().encode(
+            texts, normalize_embeddings=True, batch_size=64, convert_to_numpy=True
+        )
+
+        # Convert to list for JSON serialization; one tolist() on the full
+        # 2-D ndarray runs in C instead of a Python loop over rows
+        embeddings_list = embeddings.tolist()
+
         return jsonify({
             'embeddings': embeddings_list,
             'count': len(embeddings_list),
             'dimension': len(embeddings_list[0]) if embeddings_list else 0,
             'model': 'all-MiniLM-L6-v2'
         })
-    
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Load the model eagerly so the worker is warm before its first request.
+# Gunicorn runs without --preload, so this import happens in the worker
+# after fork — required for the ONNX path, since ORT sessions created
+# before fork() leave their intra-op thread pools broken in the child.
+# If running multiple PyTorch-path workers with --preload, share_memory()
+# in get_model keeps the weight pages shared copy-on-write.
+get_model()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
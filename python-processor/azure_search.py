@@ -3,10 +3,11 @@ Azure AI Search integration module for uploading and searching documents.
 """
 
 from typing import List, Dict, Any
+import numpy as np
 import os
 from datetime import datetime
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.search.documents import SearchClient, SearchIndexingBufferedSender
 from azure.search.documents.indexes import SearchIndexClient
 from azure.search.documents.indexes.models import (
     SearchIndex,
@@ -16,12 +17,46 @@ from azure.search.documents.indexes.models import (
     VectorSearch,
     HnswAlgorithmConfiguration,
     VectorSearchProfile,
+    ScalarQuantizationCompression,
     SearchFieldDataType
 )
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Azure's recommended cap on documents per upload request
+UPLOAD_BATCH_SIZE = 1000
+
+# Azure AI Search only accepts HNSW m in [4, 10] and
+# efConstruction/efSearch in [100, 1000]
+HNSW_M_RANGE = (4, 10)
+HNSW_EF_RANGE = (100, 1000)
+
+def _clamp(value: int, bounds) -> int:
+    """Clamp value into an inclusive (low, high) range."""
+    low, high = bounds
+    return max(low, min(high, value))
+
+def configure_hnsw_params(vector_count: int) -> Dict[str, Any]:
+    """
+    Pick HNSW parameters for the expected corpus size.
+
+    Small corpora need less graph connectivity and search effort than
+    large ones; all profiles stay inside Azure's accepted ranges
+    (m in [4, 10], efConstruction/efSearch in [100, 1000]).
+
+    Args:
+        vector_count: Expected number of vectors in the index
+
+    Returns:
+        Dict with m, efConstruction, and efSearch values
+    """
+    if vector_count < 100_000:
+        return {"m": 8, "efConstruction": 100, "efSearch": 100}
+    if vector_count < 1_000_000:
+        return {"m": 10, "efConstruction": 200, "efSearch": 200}
+    return {"m": 10, "efConstruction": 400, "efSearch": 400}
+
 class AzureSearchClient:
     """Handles Azure AI Search operations: index creation and document upload."""
     
@@ -68,23 +103,55 @@ class AzureSearchClient:
             Dict with success status and index name
         """
         try:
+            # HNSW parameters default to a profile for the expected corpus
+            # size; HNSW_M / HNSW_EF_CONSTRUCTION / HNSW_EF_SEARCH override
+            hnsw_params = configure_hnsw_params(
+                int(os.getenv('EXPECTED_VECTOR_COUNT', '50000'))
+            )
+
             # Define vector search configuration
             vector_search = VectorSearch(
                 algorithms=[
                     HnswAlgorithmConfiguration(
                         name="hnsw-config",
                         parameters={
-                            "m": 4,
-                            "efConstruction": 400,
-                            "efSearch": 500,
-                            "metric": "cosine"
+                            "m": _clamp(
+                                int(os.getenv('HNSW_M', hnsw_params['m'])),
+                                HNSW_M_RANGE
+                            ),
+                            "efConstruction": _clamp(
+                                int(os.getenv(
+                                    'HNSW_EF_CONSTRUCTION', hnsw_params['efConstruction']
+                                )),
+                                HNSW_EF_RANGE
+                            ),
+                            "efSearch": _clamp(
+                                int(os.getenv(
+                                    'HNSW_EF_SEARCH', hnsw_params['efSearch']
+                                )),
+                                HNSW_EF_RANGE
+                            ),
+                            # Vectors are L2-normalized at encode time, so
+                            # dot product ranks identically to cosine but
+                            # skips Azure's per-candidate normalization
+                            "metric": "dotProduct"
                         }
                     )
                 ],
                 profiles=[
                     VectorSearchProfile(
                         name="vector-profile",
-                        algorithm_configuration_name="hnsw-config"
+                        algorithm_configuration_name="hnsw-config",
+                        compression_name="sq"
+                    )
+                ],
+                compressions=[
+                    # SQ8 storage: ~4x smaller vectors and faster HNSW
+                    # traversal; rescoring with the original vectors keeps
+                    # recall close to full precision
+                    ScalarQuantizationCompression(
+                        compression_name="sq",
+                        rerank_with_original_vectors=True
                     )
                 ]
             )
@@ -130,54 +197,120 @@ class AzureSearchClient:
     def upload_documents(
         self,
         chunks: List[str],
-        embeddings: List[List[float]],
-        source_file: str
+        embeddings: np.ndarray,
+        source_file: str,
+        start_index: int = 0
     ) -> Dict[str, Any]:
         """
         Upload document chunks and embeddings to Azure AI Search.
-        
+
         Args:
             chunks: List of text chunks
-            embeddings: List of embedding vectors
+            embeddings: FP32 ndarray of embedding vectors, one row per chunk
             source_file: Name of the source file
-            
+            start_index: Chunk index of the first chunk, for batched uploads
+
         Returns:
             Dict with success status and count
         """
         try:
-            if len(chunks) != len(embeddings):
-                raise ValueError("Number of chunks must match number of embeddings")
-            
-            # Prepare documents
-            documents = []
-            upload_time = datetime.utcnow().isoformat() + "Z"
-            
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                doc = {
-                    "id": f"{source_file.replace('.', '_')}_{idx}",
-                    "content": chunk,
-                    "source_file": source_file,
-                    "chunk_index": idx,
-                    "upload_date": upload_time,
-                    "content_vector": embedding
-                }
-                documents.append(doc)
-            
+            documents = self.build_documents(chunks, embeddings, source_file, start_index)
+
             # Upload to Azure Search
             result = self.search_client.upload_documents(documents=documents)
-            
+
             return {
                 'success': True,
                 'count': len(documents),
                 'index_name': self.index_name,
                 'message': f"Uploaded {len(documents)} documents successfully"
             }
-            
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def upload_documents_stream(self, documents) -> Dict[str, Any]:
+        """
+        Stream documents to Azure AI Search through a buffered sender.
+
+        The sender batches, retries, and flushes in the background
+        (1000 actions per batch, 2s auto-flush), so callers can feed
+        documents from a generator without ever materializing the full
+        list in memory.
+
+        Args:
+            documents: Iterable of documents (see build_documents)
+
+        Returns:
+            Dict with success status and count
+        """
+        try:
+            count = 0
+            failed = []
+            with SearchIndexingBufferedSender(
+                endpoint=self.endpoint,
+                index_name=self.index_name,
+                credential=self.credential,
+                auto_flush_interval=2,
+                initial_batch_action_count=UPLOAD_BATCH_SIZE,
+                # Without on_error the sender drops failed actions silently
+                # after retries; collect them so the caller hears about it
+                on_error=lambda action: failed.append(action)
+            ) as sender:
+                for doc in documents:
+                    sender.upload_documents(documents=[doc])
+                    count += 1
+
+            if failed:
+                return {
+                    'success': False,
+                    'count': count - len(failed),
+                    'index_name': self.index_name,
+                    'error': f"{len(failed)} of {count} documents failed to index"
+                }
+
+            return {
+                'success': True,
+                'count': count,
+                'index_name': self.index_name,
+                'message': f"Uploaded {count} documents successfully"
+            }
+
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
+
+    def build_documents(
+        self,
+        chunks: List[str],
+        embeddings: np.ndarray,
+        source_file: str,
+        start_index: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Build Azure Search documents from chunks and their embeddings."""
+        if len(chunks) != len(embeddings):
+            raise ValueError("Number of chunks must match number of embeddings")
+
+        # Compute the id prefix and timestamp once instead of per chunk
+        safe_prefix = source_file.replace('.', '_')
+        upload_time = datetime.utcnow().isoformat() + "Z"
+
+        return [
+            {
+                "id": f"{safe_prefix}_{idx}",
+                "content": chunk,
+                "source_file": source_file,
+                "chunk_index": idx,
+                "upload_date": upload_time,
+                "content_vector": embedding.tolist()
+            }
+            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index)
+        ]
     
     def search_similar(
         self,
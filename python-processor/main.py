@@ -17,56 +17,70 @@ load_dotenv()
 processor = DocumentProcessor()
 azure_client = AzureSearchClient()
 
+# Chunks are embedded and uploaded in batches of this size so extraction,
+# embedding, and upload pipeline instead of three full passes over the file
+EMBED_BATCH_SIZE = 64
+
 def process_pdf(pdf_file):
     """
-    Process uploaded PDF file: extract text, chunk, embed, and upload to Azure.
-    
+    Process uploaded PDF file as a stream: extract pages, chunk, embed,
+    and upload in batches so the full document is never held in memory.
+
     Args:
         pdf_file: File object from Gradio file upload
-        
+
     Returns:
         str: Status message
     """
     try:
         if pdf_file is None:
             return "❌ No file uploaded"
-        
+
         # Get file path
         file_path = pdf_file.name
         file_name = Path(file_path).name
-        
-        # Step 1: Extract text from PDF
+
         status = f"📄 Processing: {file_name}\n\n"
-        status += "⏳ Extracting text from PDF...\n"
-        
-        text = processor.extract_text_from_pdf(file_path)
-        if not text:
+        status += "⏳ Extracting, chunking, embedding, and uploading in batches...\n"
+
+        pages = processor.extract_text_from_pdf(file_path)
+        totals = {'chunks': 0}
+
+        def document_stream():
+            # Chunks flow extraction -> embedding -> sender; nothing holds
+            # the full document list in memory
+            batch = []
+            for chunk in processor.chunk_text_stream(pages):
+                batch.append(chunk)
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    embeddings = processor.generate_embeddings(batch)
+                    yield from azure_client.build_documents(
+                        batch, embeddings, file_name, totals['chunks']
+                    )
+                    totals['chunks'] += len(batch)
+                    batch = []
+            if batch:
+                embeddings = processor.generate_embeddings(batch)
+                yield from azure_client.build_documents(
+                    batch, embeddings, file_name, totals['chunks']
+                )
+                totals['chunks'] += len(batch)
+
+        # The buffered sender batches, retries, and flushes in the
+        # background, overlapping uploads with the next batch's embedding
+        result = azure_client.upload_documents_stream(document_stream())
+        if not result['success']:
+            return status + f"❌ Upload failed: {result['error']}\n"
+
+        if totals['chunks'] == 0:
             return status + "❌ Error: Could not extract text from PDF"
-        
-        status += f"✅ Extracted {len(text)} characters\n\n"
-        
-        # Step 2: Chunk the text
-        status += "⏳ Chunking text...\n"
-        chunks = processor.chunk_text(text)
-        status += f"✅ Created {len(chunks)} chunks\n\n"
-        
-        # Step 3: Generate embeddings
-        status += "⏳ Generating embeddings...\n"
-        embeddings = processor.generate_embeddings(chunks)
-        status += f"✅ Generated {len(embeddings)} embeddings\n\n"
-        
-        # Step 4: Upload to Azure AI Search
-        status += "⏳ Uploading to Azure AI Search...\n"
-        result = azure_client.upload_documents(chunks, embeddings, file_name)
-        
-        if result['success']:
-            status += f"✅ Successfully uploaded {result['count']} documents to Azure\n"
-            status += f"📊 Index: {result['index_name']}\n"
-        else:
-            status += f"❌ Upload failed: {result['error']}\n"
-        
+
+        status += f"✅ Created {totals['chunks']} chunks\n"
+        status += f"✅ Successfully uploaded {result['count']} documents to Azure\n"
+        status += f"📊 Index: {result['index_name']}\n"
+
         return status
-        
+
     except Exception as e:
         return f"❌ Error processing file: {str(e)}"
 
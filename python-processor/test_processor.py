@@ -0,0 +1,32 @@
+"""
+Smoke test for the document processor chunking path
+Run this to verify chunking works with the installed dependencies
+"""
+
+from document_processor import DocumentProcessor
+
+def test_chunking():
+    print("Testing Document Processor chunking...")
+    print("-" * 50)
+
+    processor = DocumentProcessor()
+    text = "The quick brown fox jumps over the lazy dog. " * 200
+
+    # Test 1: One-shot chunking
+    print("\n1. chunk_text")
+    chunks = processor.chunk_text(text)
+    assert len(chunks) > 0, "chunk_text returned no chunks"
+    print(f"✅ Produced {len(chunks)} chunks")
+
+    # Test 2: Streaming chunking over fake pages
+    print("\n2. chunk_text_stream")
+    pages = (text[i:i + 2000] for i in range(0, len(text), 2000))
+    streamed = list(processor.chunk_text_stream(pages))
+    assert len(streamed) > 0, "chunk_text_stream returned no chunks"
+    print(f"✅ Produced {len(streamed)} chunks")
+
+    print("\n" + "-" * 50)
+    print("✅ All tests passed!")
+
+if __name__ == "__main__":
+    test_chunking()